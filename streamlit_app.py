@@ -1,9 +1,10 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
-from scipy.stats import norm
-import matplotlib.pyplot as plt
+from scipy.special import ndtr
+from matplotlib.figure import Figure
 import seaborn as sns
+import os
+import numexpr as ne
 from numpy import log, sqrt, exp
 
 #######################
@@ -53,87 +54,147 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-class BlackScholes:
-    def __init__(self, time_to_maturity, strike, current_price, volatility, interest_rate):
-        self.time_to_maturity = time_to_maturity
-        self.strike = strike
-        self.current_price = current_price
-        self.volatility = volatility
-        self.interest_rate = interest_rate
+SQRT_2PI = sqrt(2 * np.pi)
+
+# Black-Scholes functions; every argument may be a scalar or a broadcastable NumPy array
+def bs_d1_d2(current_price, strike, time_to_maturity, interest_rate, volatility):
+    vol_sqrtT = volatility * sqrt(time_to_maturity)
+
+    d1 = (log(current_price / strike) + (interest_rate + 0.5 * volatility ** 2) * time_to_maturity) / vol_sqrtT
+    d2 = d1 - vol_sqrtT
+
+    return d1, d2, vol_sqrtT
+
+def bs_call_put(current_price, strike, time_to_maturity, interest_rate, volatility):
+    d1, d2, _ = bs_d1_d2(current_price, strike, time_to_maturity, interest_rate, volatility)
+    disc = exp(-(interest_rate * time_to_maturity))
+
+    call_price = current_price * ndtr(d1) - strike * disc * ndtr(d2)
+    put_price = strike * disc * ndtr(-d2) - current_price * ndtr(-d1)
+
+    return call_price, put_price
+
+def bs_greeks(current_price, strike, time_to_maturity, interest_rate, volatility):
+    d1, _, vol_sqrtT = bs_d1_d2(current_price, strike, time_to_maturity, interest_rate, volatility)
+    Nd1 = ndtr(d1)
+
+    call_gamma = exp(-0.5 * d1 * d1) / SQRT_2PI / (strike * vol_sqrtT)
+
+    return {
+        "call_delta": Nd1,
+        "put_delta": 1 - Nd1,
+        "call_gamma": call_gamma,
+        "put_gamma": call_gamma,
+    }
+
+# numexpr's thread count is process-wide, so set it once per server rather than on every script rerun
+@st.cache_resource
+def _init_numexpr():
+    ne.set_num_threads(os.cpu_count() or 1)
+
+_init_numexpr()
+
+# Function to price calls and puts over a (volatility, spot) grid
+def _price_grid_kernel(spot_range, vol_range, strike, time_to_maturity, interest_rate):
+    # Everything that depends on only one axis (or neither) is computed once here and broadcast,
+    # as a row over spot prices or a column over volatilities, instead of once per grid cell
+    sqrtT = sqrt(time_to_maturity)
+    grid = {
+        "S": spot_range[None, :],
+        "log_S_over_K": log(spot_range / strike)[None, :],
+        "half_var_T": (0.5 * vol_range ** 2 * time_to_maturity)[:, None],
+        "vol_sqrtT": (vol_range * sqrtT)[:, None],
+        "rT": interest_rate * time_to_maturity,
+        "disc_K": strike * exp(-(interest_rate * time_to_maturity)),
+    }
+
+    # numexpr fuses each expression into one pass, so no per-operator temporaries are allocated
+    grid["d1"] = ne.evaluate("(log_S_over_K + rT + half_var_T) / vol_sqrtT", local_dict=grid)
+    grid["d2"] = ne.evaluate("d1 - vol_sqrtT", local_dict=grid)
+    grid["Nd1"] = ndtr(grid["d1"])
+    grid["Nd2"] = ndtr(grid["d2"])
+
+    call_grid = ne.evaluate("S * Nd1 - disc_K * Nd2", local_dict=grid)
+    grid["call_grid"] = call_grid
+    put_grid = ne.evaluate("call_grid - S + disc_K", local_dict=grid)  # Put-call parity, no extra CDF evaluations
+    np.maximum(put_grid, 0.0, out=put_grid)  # Cancellation in the parity step can leave tiny negatives ("-0.00")
+
+    return call_grid, put_grid
+
+# Function to price calls and puts over the whole (volatility, spot) grid.
+# Ranges are passed as tuples so Streamlit can hash them; unchanged inputs are served from the cache on reruns.
+@st.cache_data(max_entries=32)
+def compute_price_grid(spot_range, vol_range, strike, time_to_maturity, interest_rate):
+    # Stays in float64: float32's ~1e-7 relative error reaches the 0.01 display step once prices
+    # are in the tens of thousands, and the parity subtraction for puts cancels large terms.
+    spot_range = np.asarray(spot_range, dtype=np.float64)
+    vol_range = np.asarray(vol_range, dtype=np.float64)
+
+    return _price_grid_kernel(spot_range, vol_range, strike, time_to_maturity, interest_rate)
+
+# Function to thin out tick labels so large grids stay readable
+def _tick_labels(values, max_labels=10):
+    step = max(1, len(values) // max_labels)
+    return [np.round(value, 2) if i % step == 0 else "" for i, value in enumerate(values)]
+
+# Function to pick dark or white annotation text per cell from the cell's colour, the same
+# relative-luminance rule sns.heatmap uses; call it after the image's color limits are final
+def _text_colors(im, values):
+    rgb = im.cmap(im.norm(values))[..., :3]
+    rgb = np.where(rgb <= 0.03928, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    luminance = rgb @ np.array([0.2126, 0.7152, 0.0722])
+    return np.where(luminance > 0.408, ".15", "w")
+
+# Function to draw a grid as a single image, with per-cell values only on small grids.
+# The figure for each slot is kept in session_state and only its image data is swapped on reruns;
+# it is rebuilt when the grid resolution changes.
+def _draw_grid(slot, values, spot_range, vol_range, cmap, title):
+    cached = st.session_state.get(slot)
+    if cached is None or cached[2].get_array().shape != values.shape:
+        # A bare Figure is not registered with pyplot, so it is freed once session_state drops it
+        fig = Figure(figsize=(10, 8))
+        ax = fig.subplots()
+        im = ax.imshow(np.zeros_like(values), cmap=cmap, aspect='auto', origin='lower')
+        fig.colorbar(im, ax=ax)
+        ax.set_title(title)
+        ax.set_xlabel('Spot Price')
+        ax.set_ylabel('Volatility')
+        ax.set_xticks(range(len(spot_range)))
+        ax.set_yticks(range(len(vol_range)))
+        st.session_state[slot] = (fig, ax, im)
+    else:
+        fig, ax, im = cached
+
+    im.set_data(values)
+    im.set_clim(values.min(), values.max())
+    ax.set_xticklabels(_tick_labels(spot_range))
+    ax.set_yticklabels(_tick_labels(vol_range))
+
+    for text in list(ax.texts):
+        text.remove()
+    if len(spot_range) <= 12:
+        text_colors = _text_colors(im, values)
+        for i in range(len(vol_range)):
+            for j in range(len(spot_range)):
+                ax.text(j, i, f"{values[i, j]:.2f}", ha="center", va="center", color=text_colors[i, j])
 
-    def calculate_prices(self):
-        time_to_maturity = self.time_to_maturity
-        strike = self.strike
-        current_price = self.current_price
-        volatility = self.volatility
-        interest_rate = self.interest_rate
-
-        d1 = (log(current_price / strike) + (interest_rate + 0.5 * volatility ** 2) * time_to_maturity) / (volatility * sqrt(time_to_maturity))
-        d2 = d1 - volatility * sqrt(time_to_maturity)
-
-        call_price = current_price * norm.cdf(d1) - strike * exp(-(interest_rate * time_to_maturity)) * norm.cdf(d2)
-        put_price = strike * exp(-(interest_rate * time_to_maturity)) * norm.cdf(-d2) - current_price * norm.cdf(-d1)
-
-        self.call_price = call_price
-        self.put_price = put_price
-
-        self.call_delta = norm.cdf(d1)
-        self.put_delta = 1 - norm.cdf(d1)
-        self.call_gamma = norm.pdf(d1) / (strike * volatility * sqrt(time_to_maturity))
-        self.put_gamma = self.call_gamma
-
-        return call_price, put_price
+    return fig
 
 # Function to generate heatmaps
-def plot_heatmap(bs_model, spot_range, vol_range, strike, option_type):
-    price_diffs = np.zeros((len(vol_range), len(spot_range)))
-    
-    for i, vol in enumerate(vol_range):
-        for j, spot in enumerate(spot_range):
-            bs_temp = BlackScholes(
-                time_to_maturity=bs_model.time_to_maturity,
-                strike=strike,
-                current_price=spot,
-                volatility=vol,
-                interest_rate=bs_model.interest_rate
-            )
-            bs_temp.calculate_prices()
-            predicted_price = bs_temp.call_price if option_type == "call" else bs_temp.put_price
-            price_diffs[i, j] = predicted_price
+def plot_heatmap(price_grids, spot_range, vol_range, option_type):
+    call_grid, put_grid = price_grids
+    price_diffs = call_grid if option_type == "call" else put_grid
     
-    fig, ax = plt.subplots(figsize=(10, 8))
-    sns.heatmap(price_diffs, xticklabels=np.round(spot_range, 2), yticklabels=np.round(vol_range, 2), annot=True, fmt=".2f", cmap="viridis", ax=ax)
-    ax.set_title(f'{option_type.upper()} Price Heatmap')
-    ax.set_xlabel('Spot Price')
-    ax.set_ylabel('Volatility')
-    
-    return fig
+    return _draw_grid(f'fig_{option_type}_heatmap', price_diffs, spot_range, vol_range, "viridis", f'{option_type.upper()} Price Heatmap')
 
 # Function to generate color maps for price differences
-def plot_price_diff_colormap(bs_model, spot_range, vol_range, purchase_price_range, option_type):
-    price_diffs = np.zeros((len(vol_range), len(spot_range)))
-    
-    for i, vol in enumerate(vol_range):
-        for j, spot in enumerate(spot_range):
-            bs_temp = BlackScholes(
-                time_to_maturity=bs_model.time_to_maturity,
-                strike=bs_model.strike,
-                current_price=spot,
-                volatility=vol,
-                interest_rate=bs_model.interest_rate
-            )
-            bs_temp.calculate_prices()
-            predicted_price = bs_temp.call_price if option_type == "call" else bs_temp.put_price
-            price_diffs[i, j] = predicted_price - purchase_price_range[i]  # Adjusted for varying purchase prices
+def plot_price_diff_colormap(price_grids, spot_range, vol_range, purchase_price_range, option_type):
+    call_grid, put_grid = price_grids
+    predicted_prices = call_grid if option_type == "call" else put_grid
+    price_diffs = predicted_prices - purchase_price_range[:, None]  # Adjusted for varying purchase prices
     
-    fig, ax = plt.subplots(figsize=(10, 8))
     cmap = sns.diverging_palette(10, 150, as_cmap=True)  # Custom colormap from bright green (negative) to bright red (positive)
-    sns.heatmap(price_diffs, xticklabels=np.round(spot_range, 2), yticklabels=np.round(vol_range, 2), annot=True, fmt=".2f", cmap=cmap, ax=ax)
-    ax.set_title(f'{option_type.upper()} Price Difference')
-    ax.set_xlabel('Spot Price')
-    ax.set_ylabel('Volatility')
-    
-    return fig
+    return _draw_grid(f'fig_{option_type}_price_diff', price_diffs, spot_range, vol_range, cmap, f'{option_type.upper()} Price Difference')
 
 
 # Sidebar for User Inputs
@@ -159,11 +220,12 @@ with st.sidebar:
     purchase_max_call = st.number_input('Max Purchase Price for Call', min_value=0.01, value=10.0*1.2, step=0.01)
     purchase_min_put = st.number_input('Min Purchase Price for Put', min_value=0.01, value=10.0*0.8, step=0.01)
     purchase_max_put = st.number_input('Max Purchase Price for Put', min_value=0.01, value=10.0*1.2, step=0.01)
+    grid_n = st.slider('Heatmap resolution', 10, 128, 32)
 
-    spot_range = np.linspace(spot_min, spot_max, 10)
-    vol_range = np.linspace(vol_min, vol_max, 10)
-    purchase_call_range = np.linspace(purchase_min_call, purchase_max_call, 10)
-    purchase_put_range = np.linspace(purchase_min_put, purchase_max_put, 10)
+    spot_range = np.linspace(spot_min, spot_max, grid_n)
+    vol_range = np.linspace(vol_min, vol_max, grid_n)
+    purchase_call_range = np.linspace(purchase_min_call, purchase_max_call, grid_n)
+    purchase_put_range = np.linspace(purchase_min_put, purchase_max_put, grid_n)
 
 # Main Page for Output Display
 st.title("Black-Scholes Pricing Model")
@@ -176,12 +238,10 @@ input_data = {
     "Volatility (σ)": [volatility],
     "Risk-Free Interest Rate": [interest_rate],
 }
-input_df = pd.DataFrame(input_data)
-st.table(input_df)
+st.table(input_data)
 
 # Calculate Call and Put values
-bs_model = BlackScholes(time_to_maturity, strike, current_price, volatility, interest_rate)
-call_price, put_price = bs_model.calculate_prices()
+call_price, put_price = bs_call_put(current_price, strike, time_to_maturity, interest_rate, volatility)
 
 # Display Call and Put Values in colored tables
 col1, col2 = st.columns([1,1], gap="small")
@@ -213,14 +273,16 @@ st.info("Explore how option prices fluctuate with varying 'Spot Prices and Volat
 # Interactive Sliders and Heatmaps for Call and Put Options
 col1, col2 = st.columns([1,1], gap="small")
 
+price_grids = compute_price_grid(tuple(spot_range), tuple(vol_range), strike, time_to_maturity, interest_rate)
+
 with col1:
     st.subheader("Call Price Heatmap")
-    heatmap_fig_call = plot_heatmap(bs_model, spot_range, vol_range, strike, "call")
+    heatmap_fig_call = plot_heatmap(price_grids, spot_range, vol_range, "call")
     st.pyplot(heatmap_fig_call)
 
 with col2:
     st.subheader("Put Price Heatmap")
-    heatmap_fig_put = plot_heatmap(bs_model, spot_range, vol_range, strike, "put")
+    heatmap_fig_put = plot_heatmap(price_grids, spot_range, vol_range, "put")
     st.pyplot(heatmap_fig_put)
 
 # Color maps for the difference between predicted and purchase prices
@@ -231,10 +293,10 @@ col1, col2 = st.columns([1, 1], gap="small")
 
 with col1:
     st.subheader("Call Price Difference Color Map")
-    call_diff_colormap = plot_price_diff_colormap(bs_model, spot_range, vol_range, purchase_call_range, "call")
+    call_diff_colormap = plot_price_diff_colormap(price_grids, spot_range, vol_range, purchase_call_range, "call")
     st.pyplot(call_diff_colormap)
 
 with col2:
     st.subheader("Put Price Difference Color Map")
-    put_diff_colormap = plot_price_diff_colormap(bs_model, spot_range, vol_range, purchase_put_range, "put")
+    put_diff_colormap = plot_price_diff_colormap(price_grids, spot_range, vol_range, purchase_put_range, "put")
     st.pyplot(put_diff_colormap)